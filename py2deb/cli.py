@@ -106,6 +106,13 @@ Supported options:
     contains relationships the additional relationships will be added
     to the control file; they won't overwrite existing relationships.
 
+  -j, --concurrency=COUNT
+
+    Convert up to COUNT packages at the same time. Defaults to one, which
+    means packages are converted one after another.
+
+    Can also be set using the environment variable $PY2DEB_CONCURRENCY.
+
   -y, --yes
 
     Instruct pip-accel to automatically install build time dependencies
@@ -148,11 +155,11 @@ def main():
         # Initialize a package converter.
         converter = PackageConverter()
         # Parse and validate the command line options.
-        options, arguments = getopt.getopt(sys.argv[1:], 'c:r:yvh', [
+        options, arguments = getopt.getopt(sys.argv[1:], 'c:r:j:yvh', [
             'config=', 'repository=', 'use-system-package=', 'name-prefix=',
             'no-name-prefix=', 'rename=', 'install-prefix=',
             'install-alternative=', 'python-callback=', 'report-dependencies=',
-            'yes', 'verbose', 'help',
+            'concurrency=', 'yes', 'verbose', 'help',
         ])
         control_file_to_update = None
         for option, value in options:
@@ -182,6 +189,8 @@ def main():
                 if not os.path.isfile(control_file_to_update):
                     msg = "The given control file doesn't exist! (%s)"
                     raise Exception(msg % control_file_to_update)
+            elif option in ('-j', '--concurrency'):
+                converter.set_concurrency(value)
             elif option in ('-y', '--yes'):
                 converter.set_auto_install(True)
             elif option in ('-v', '--verbose'):
@@ -18,31 +18,40 @@ conversion logic.
 """
 
 # Standard library modules.
+import hashlib
 import importlib
+import json
 import logging
+import multiprocessing
 import os
 import re
+import shlex
 import shutil
 import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
 
 # External dependencies.
 from property_manager import PropertyManager, cached_property, lazy_property, mutable_property, set_property
 from deb_pkg_tools.cache import get_default_cache
 from deb_pkg_tools.checks import check_duplicate_files
 from deb_pkg_tools.utils import find_debian_architecture
-from humanfriendly import coerce_boolean, compact
+from executor import execute
+from humanfriendly import coerce_boolean, compact, concatenate, pluralize
 from pip_accel import PipAccelerator
 from pip_accel.config import Config as PipAccelConfig
 from six.moves import configparser
 
 # Modules included in our package.
+from py2deb import __version__
 from py2deb.utils import (
     PackageRepository,
     convert_package_name,
     default_name_prefix,
+    environment_defaults,
     normalize_package_name,
     normalize_package_version,
-    package_names_match,
+    python_version,
     tokenize_version,
 )
 from py2deb.package import PackageToConvert
@@ -50,6 +59,27 @@ from py2deb.package import PackageToConvert
 # Initialize a logger.
 logger = logging.getLogger(__name__)
 
+CACHE_UNSAFE_OPTIONS = ('-U', '--upgrade', '-e', '--editable', '-f', '--find-links')
+"""
+The ``pip install`` options that disable the conversion cache (a tuple of strings).
+
+Refer to :func:`PackageConverter.get_conversion_cache_key()` for details.
+"""
+
+REQUIREMENT_FILE_OPTIONS = ('-r', '--requirement', '-c', '--constraint')
+"""The ``pip install`` options that reference requirement files (a tuple of strings)."""
+
+URL_PATTERN = re.compile(r'^((bzr|git|hg|svn)\+|[a-z][a-z0-9+.-]*://|file:)', re.IGNORECASE)
+"""Compiled regular expression to match (version control) URLs understood by pip."""
+
+WORKER_TIMEOUT = 60 * 60 * 24 * 365
+"""
+The number of seconds to wait for concurrent conversions (an integer).
+
+This is intentionally very large: It exists because on Python 2 a wait
+without timeout can't be interrupted using Control-C.
+"""
+
 MACHINE_ARCHITECTURE_MAPPING = dict(i686='i386', x86_64='amd64', armv6l='armhf')
 """
 Mapping of supported machine architectures (a dictionary).
@@ -80,6 +110,8 @@ class PackageConverter(PropertyManager):
         super(PackageConverter, self).__init__(**options)
         # Initialize our internal state.
         self.pip_accel = PipAccelerator(PipAccelConfig())
+        self.lintian_condition = threading.Condition()
+        self.lintian_pending = 0
         if load_configuration_files:
             self.load_default_configuration_files()
         if load_environment_variables:
@@ -98,6 +130,64 @@ class PackageConverter(PropertyManager):
         """
         return set()
 
+    @mutable_property
+    def concurrency(self):
+        """
+        The number of packages to convert concurrently (a positive integer, defaults to 1).
+
+        Converting a package is dominated by external commands (building the
+        binary distribution, running ``dpkg-deb`` and Lintian_) so converting
+        a large requirement set can be sped up considerably by converting
+        several packages at the same time. Packages that were already
+        converted in a previous run are never rebuilt so they don't count
+        towards this limit.
+
+        :raises: :exc:`~exceptions.ValueError` when you set this to something
+                 that's not a positive integer.
+        """
+        return 1
+
+    @concurrency.setter
+    def concurrency(self, value):
+        """Automatically coerce :attr:`concurrency` to a positive integer."""
+        try:
+            value = int(value)
+            assert value >= 1
+        except Exception:
+            msg = "Concurrency should be a positive integer! (got %r)"
+            raise ValueError(msg % value)
+        set_property(self, 'concurrency', value)
+
+    @mutable_property
+    def conversion_cache_directory(self):
+        """
+        The directory where the results of previous conversions are stored (a string).
+
+        Defaults to the ``py2deb`` subdirectory of pip-accel's data directory,
+        because the stored results are only meaningful in combination with
+        pip-accel's local source index. Refer to :func:`recall_conversion()`
+        for details.
+        """
+        return os.path.join(self.pip_accel.config.data_directory, 'py2deb')
+
+    @mutable_property
+    def conversion_cache_enabled(self):
+        """
+        :data:`True` to reuse the results of previous conversions, :data:`False` otherwise (defaults to :data:`False`).
+
+        When this is enabled and the same requirement set is converted again
+        the previous result is reused without running pip (refer to
+        :func:`recall_conversion()` for details). Because pip isn't run,
+        unpinned requirements don't pick up new releases on PyPI, which is
+        why this is opt-in.
+        """
+        return False
+
+    @conversion_cache_enabled.setter
+    def conversion_cache_enabled(self, value):
+        """Automatically coerce :attr:`conversion_cache_enabled` to a boolean value."""
+        set_property(self, 'conversion_cache_enabled', coerce_boolean(value))
+
     @cached_property
     def debian_architecture(self):
         """
@@ -132,6 +222,28 @@ class PackageConverter(PropertyManager):
         """
         return '/usr'
 
+    @lazy_property
+    def installed_system_packages(self):
+        """
+        The system packages known to be installed (a set of strings).
+
+        This is populated by :func:`find_missing_system_packages()` and
+        :func:`install_build_dependencies()` so that ``dpkg-query`` is only
+        asked about each build dependency once.
+        """
+        return set()
+
+    @lazy_property
+    def lintian_checks(self):
+        """
+        The Lintian checks that are running in the background (a list of tuples).
+
+        Each tuple contains the pathname of a package archive and the
+        :class:`~executor.ExternalCommand` object that's checking the archive.
+        Refer to :func:`check_package()` for details.
+        """
+        return []
+
     @mutable_property
     def lintian_enabled(self):
         """
@@ -452,6 +564,26 @@ class PackageConverter(PropertyManager):
         """
         self.pip_accel.config.auto_install = coerce_boolean(enabled)
 
+    def set_concurrency(self, value):
+        """
+        Set the number of packages to convert concurrently.
+
+        :param value: A positive integer (or a string containing one).
+        :raises: :exc:`~exceptions.ValueError` when the value is not a
+                 positive integer.
+        """
+        self.concurrency = value
+
+    def set_conversion_cache_enabled(self, enabled):
+        """
+        Enable or disable reusing the results of previous conversions.
+
+        :param enabled: Any value, evaluated using :func:`~humanfriendly.coerce_boolean()`.
+
+        Refer to :attr:`conversion_cache_enabled` for details.
+        """
+        self.conversion_cache_enabled = enabled
+
     def set_conversion_command(self, python_package_name, command):
         """
         Set shell command to be executed during conversion process.
@@ -576,6 +708,8 @@ class PackageConverter(PropertyManager):
         - ``$PY2DEB_INSTALL_PREFIX``
         - ``$PY2DEB_AUTO_INSTALL``
         - ``$PY2DEB_LINTIAN``
+        - ``$PY2DEB_CONCURRENCY``
+        - ``$PY2DEB_CONVERSION_CACHE``
         """
         for variable, setter in (('PY2DEB_CONFIG', self.load_configuration_file),
                                  ('PY2DEB_REPOSITORY', self.set_repository),
@@ -583,6 +717,8 @@ class PackageConverter(PropertyManager):
                                  ('PY2DEB_INSTALL_PREFIX', self.set_install_prefix),
                                  ('PY2DEB_AUTO_INSTALL', self.set_auto_install),
                                  ('PY2DEB_LINTIAN', self.set_lintian_enabled),
+                                 ('PY2DEB_CONCURRENCY', self.set_concurrency),
+                                 ('PY2DEB_CONVERSION_CACHE', self.set_conversion_cache_enabled),
                                  ('PY2DEB_CALLBACK', self.set_python_callback)):
             value = os.environ.get(variable)
             if value is not None:
@@ -610,6 +746,8 @@ class PackageConverter(PropertyManager):
            install-prefix = /usr/lib/py2deb
            auto-install = on
            lintian = on
+           concurrency = 4
+           conversion-cache = off
 
            # The `alternatives' section contains instructions
            # for Debian's `update-alternatives' system.
@@ -650,36 +788,36 @@ class PackageConverter(PropertyManager):
         except Exception:
             msg = "Failed to load configuration file! (%s)"
             raise Exception(msg % configuration_file)
+        # Copy the parsed options into plain dictionaries once, instead of
+        # going through the configuration parser for every lookup.
+        sections = dict((name, dict(parser.items(name))) for name in parser.sections())
         # Apply the global settings in the configuration file.
-        if parser.has_option('py2deb', 'repository'):
-            self.set_repository(parser.get('py2deb', 'repository'))
-        if parser.has_option('py2deb', 'name-prefix'):
-            self.set_name_prefix(parser.get('py2deb', 'name-prefix'))
-        if parser.has_option('py2deb', 'install-prefix'):
-            self.set_install_prefix(parser.get('py2deb', 'install-prefix'))
-        if parser.has_option('py2deb', 'auto-install'):
-            self.set_auto_install(parser.get('py2deb', 'auto-install'))
-        if parser.has_option('py2deb', 'lintian'):
-            self.set_lintian_enabled(parser.get('py2deb', 'lintian'))
-        if parser.has_option('py2deb', 'python-callback'):
-            self.set_python_callback(parser.get('py2deb', 'python-callback'))
+        global_options = sections.get('py2deb', {})
+        for option, setter in (('repository', self.set_repository),
+                               ('name-prefix', self.set_name_prefix),
+                               ('install-prefix', self.set_install_prefix),
+                               ('auto-install', self.set_auto_install),
+                               ('lintian', self.set_lintian_enabled),
+                               ('concurrency', self.set_concurrency),
+                               ('conversion-cache', self.set_conversion_cache_enabled),
+                               ('python-callback', self.set_python_callback)):
+            if option in global_options:
+                setter(global_options[option])
         # Apply the defined alternatives.
-        if parser.has_section('alternatives'):
-            for link, path in parser.items('alternatives'):
-                self.install_alternative(link, path)
+        for link, path in sections.get('alternatives', {}).items():
+            self.install_alternative(link, path)
         # Apply any package specific settings.
         for section in parser.sections():
             tag, _, package = section.partition(':')
             if tag == 'package':
-                if parser.has_option(section, 'no-name-prefix'):
-                    if parser.getboolean(section, 'no-name-prefix'):
+                options = sections[section]
+                if 'no-name-prefix' in options:
+                    if coerce_boolean(options['no-name-prefix']):
                         self.rename_package(package, package)
-                if parser.has_option(section, 'rename'):
-                    rename_to = parser.get(section, 'rename')
-                    self.rename_package(package, rename_to)
-                if parser.has_option(section, 'script'):
-                    script = parser.get(section, 'script')
-                    self.set_conversion_command(package, script)
+                if 'rename' in options:
+                    self.rename_package(package, options['rename'])
+                if 'script' in options:
+                    self.set_conversion_command(package, options['script'])
 
     def load_default_configuration_files(self):
         """
@@ -727,13 +865,25 @@ class PackageConverter(PropertyManager):
 
         """
         try:
+            # Skip the whole conversion process when the same requirement
+            # set has already been converted (and nothing changed since).
+            cache_key = self.get_conversion_cache_key(pip_install_arguments)
+            if cache_key:
+                cached_result = self.recall_conversion(cache_key)
+                if cached_result:
+                    return cached_result
             generated_archives = []
             dependencies_to_report = []
             # Download and unpack the requirement set and store the complete
-            # set as an instance variable because transform_version() will need
-            # it later on.
+            # set as an instance variable (indexed by normalized package name)
+            # because transform_version() will need it later on.
             self.packages_to_convert = list(self.get_source_distributions(pip_install_arguments))
-            # Convert packages that haven't been converted already.
+            self.packages_by_name = {}
+            for package in self.packages_to_convert:
+                normalized_name = normalize_package_name(package.python_name)
+                self.packages_by_name.setdefault(normalized_name, []).append(package)
+            # Find the packages that haven't been converted already.
+            packages_to_build = []
             for package in self.packages_to_convert:
                 # If the requirement is a 'direct' (non-transitive) requirement
                 # it means the caller explicitly asked for this package to be
@@ -749,11 +899,18 @@ class PackageConverter(PropertyManager):
                                 package.existing_archive.filename)
                     generated_archives.append(package.existing_archive)
                 else:
-                    archive = package.convert()
-                    if not os.path.samefile(os.path.dirname(archive), self.repository.directory):
-                        shutil.move(archive, self.repository.directory)
-                        archive = os.path.join(self.repository.directory, os.path.basename(archive))
-                    generated_archives.append(archive)
+                    packages_to_build.append(package)
+            # Install known build dependencies up front (when allowed).
+            self.install_build_dependencies(packages_to_build)
+            # Convert the remaining packages (possibly concurrently).
+            num_workers = min(self.concurrency, len(packages_to_build))
+            with environment_defaults(self.get_build_environment(num_workers)):
+                new_archives = self.convert_packages(packages_to_build)
+            # Make the new archives known to the repository so that
+            # subsequent conversions can find them without rescanning.
+            for archive in new_archives:
+                self.repository.add_archive(archive)
+            generated_archives.extend(new_archives)
             # Use deb-pkg-tools to sanity check the generated package archives
             # for duplicate files. This should never occur but unfortunately
             # can happen because Python's packaging infrastructure is a lot
@@ -761,13 +918,452 @@ class PackageConverter(PropertyManager):
             # installed by other packages ;-).
             if len(generated_archives) > 1:
                 check_duplicate_files(generated_archives, cache=get_default_cache())
+            # Remember the result so that the next run can skip all of the above.
+            dependencies_to_report = sorted(dependencies_to_report)
+            if cache_key:
+                self.persist_conversion(cache_key, generated_archives, dependencies_to_report)
             # Let the caller know which archives were generated (whether
             # previously or now) and how to depend on the converted packages.
-            return generated_archives, sorted(dependencies_to_report)
+            return generated_archives, dependencies_to_report
         finally:
+            # Always wait for (and report) the Lintian checks started above.
+            self.report_lintian_checks()
             # Always clean up temporary directories created by pip and pip-accel.
             self.pip_accel.cleanup_temporary_directories()
 
+    def install_build_dependencies(self, packages):
+        """
+        Install the known system dependencies of a group of packages in one go.
+
+        :param packages: A list of :class:`.PackageToConvert` objects that are
+                         about to be converted.
+
+        pip-accel knows which system packages are required to build certain
+        Python packages, but it only installs them after a build has failed,
+        one Python package at a time (running the system package manager each
+        time). When automatic installation is enabled (see
+        :func:`set_auto_install()`) this method installs the missing known
+        dependencies of all of the given packages that don't have a cached
+        binary distribution yet, using a single invocation of the system
+        package manager before any builds are started. pip-accel's own
+        handling of failed builds remains in place as a fall back.
+        """
+        if not (packages and self.pip_accel.config.auto_install):
+            return
+        try:
+            manager = self.pip_accel.bdists.system_package_manager
+            known_dependencies = set()
+            for package in packages:
+                if not self.pip_accel.bdists.cache.get(package.requirement):
+                    known_dependencies.update(manager.dependencies.get(package.python_name.lower(), []))
+            missing_dependencies = self.find_missing_system_packages(known_dependencies)
+            if missing_dependencies:
+                logger.info("Installing %s: %s",
+                            pluralize(len(missing_dependencies), "missing build dependency",
+                                      "missing build dependencies"),
+                            concatenate(missing_dependencies))
+                execute(*(shlex.split(manager.install_command) + missing_dependencies),
+                        sudo=True, logger=logger)
+                self.installed_system_packages.update(missing_dependencies)
+        except Exception:
+            logger.warning("Failed to install build dependencies up front, leaving it to pip-accel ..",
+                           exc_info=True)
+
+    def find_missing_system_packages(self, names):
+        """
+        Find the system packages that aren't installed yet.
+
+        :param names: An iterable of strings with system package names.
+        :returns: A sorted list of strings with the names of the system
+                  packages that aren't installed.
+
+        Instead of listing all installed system packages this only asks
+        ``dpkg-query`` about the given packages, in a single invocation.
+        Packages that are known to be installed are remembered (see
+        :attr:`installed_system_packages`) so they're not queried again.
+        """
+        unknown = sorted(set(names).difference(self.installed_system_packages))
+        if unknown:
+            output = execute('dpkg-query', '--show', '--showformat=${Package} ${Status}\\n', *unknown,
+                             capture=True, capture_stderr=True, check=False, logger=logger)
+            for line in output.splitlines():
+                tokens = line.split()
+                if len(tokens) == 4 and tokens[1:] == ['install', 'ok', 'installed']:
+                    self.installed_system_packages.add(tokens[0])
+        return [name for name in unknown if name not in self.installed_system_packages]
+
+    def get_build_environment(self, num_workers):
+        """
+        Get the environment variables that enable parallel compilation.
+
+        :param num_workers: The number of packages that are being converted
+                            at the same time (a positive integer).
+        :returns: A dictionary with environment variables.
+
+        Python packages that contain C extensions can spend most of their
+        conversion time compiling code. The variables in this dictionary ask
+        the build tools that honor them (``make`` and :mod:`numpy.distutils`)
+        to use the number of parallel jobs given by :func:`get_build_jobs()`.
+        They're set while binary distributions are being built, unless the
+        operator already defined them (see :func:`.environment_defaults()`).
+        """
+        num_jobs = self.get_build_jobs(num_workers)
+        return dict(MAKEFLAGS='-j%i' % num_jobs,
+                    NPY_NUM_BUILD_JOBS='%i' % num_jobs)
+
+    def get_build_jobs(self, num_workers):
+        """
+        Get the number of parallel jobs available to each build.
+
+        :param num_workers: The number of packages that are being converted
+                            at the same time (a positive integer).
+        :returns: A positive integer.
+
+        This is the number of CPU cores divided by the number of workers, so
+        that converting several packages at the same time doesn't
+        oversubscribe the CPU (while a single remaining package can use all
+        of the cores).
+        """
+        try:
+            num_cores = multiprocessing.cpu_count()
+        except NotImplementedError:
+            num_cores = 1
+        return max(1, num_cores // max(1, num_workers))
+
+    def convert_packages(self, packages):
+        """
+        Convert a group of Python packages to Debian packages.
+
+        :param packages: A list of :class:`.PackageToConvert` objects.
+        :returns: A list of strings containing the pathnames of the generated
+                  Debian package archives (in the same order as `packages`).
+
+        The packages are converted using :func:`convert_package()`. When
+        :attr:`concurrency` is greater than one, up to that many packages are
+        converted at the same time using a pool of threads. This works because
+        the conversion of a package doesn't depend on the conversion of its
+        dependencies and the heavy lifting is done by external commands.
+
+        When a build fails pip-accel installs missing system packages
+        (possibly after prompting the operator) before retrying the build.
+        While packages are converted concurrently these installations are
+        serialized, so that workers never compete for the terminal or the
+        lock of the system package manager.
+        """
+        num_workers = min(self.concurrency, len(packages))
+        if num_workers <= 1:
+            return [self.convert_package(p) for p in packages]
+        logger.info("Converting %i packages using %i concurrent workers ..", len(packages), num_workers)
+        manager = self.pip_accel.bdists.system_package_manager
+        install_dependencies = manager.install_dependencies
+        install_lock = threading.Lock()
+
+        def serialized_install_dependencies(requirement):
+            with install_lock:
+                return install_dependencies(requirement)
+
+        pool = ThreadPool(num_workers)
+        try:
+            manager.install_dependencies = serialized_install_dependencies
+            return pool.map_async(self.convert_package, packages).get(WORKER_TIMEOUT)
+        except KeyboardInterrupt:
+            # Don't start any new conversions.
+            pool.terminate()
+            raise
+        finally:
+            pool.close()
+            pool.join()
+            # Restore the method of the system package manager.
+            del manager.install_dependencies
+
+    def convert_package(self, package):
+        """
+        Convert a single Python package to a Debian package.
+
+        :param package: A :class:`.PackageToConvert` object.
+        :returns: The pathname of the generated Debian package archive (a
+                  string) inside the :attr:`repository` directory.
+        """
+        archive = package.convert(check_package=False)
+        if not os.path.samefile(os.path.dirname(archive), self.repository.directory):
+            shutil.move(archive, self.repository.directory)
+            archive = os.path.join(self.repository.directory, os.path.basename(archive))
+        if self.lintian_enabled:
+            self.check_package(archive)
+        return archive
+
+    def check_package(self, archive):
+        """
+        Start checking a generated package archive using Lintian_.
+
+        :param archive: The pathname of a ``*.deb`` archive (a string).
+
+        Lintian can take several seconds to check a package and its findings
+        are only informational (see :attr:`lintian_enabled`), so it runs
+        in the background while the next package is converted. To avoid
+        starting an unbounded number of Lintian processes, at most
+        :attr:`concurrency` checks run at the same time: When that limit is
+        reached the oldest check is waited for (and reported) first. The
+        remaining checks are reported by :func:`report_lintian_checks()`
+        once all packages have been converted.
+        """
+        if not os.access('/usr/bin/lintian', os.X_OK):
+            logger.warning("Lintian is not installed, skipping sanity check.")
+            return
+        # Reserve one of the available slots, reporting the oldest check
+        # when none are available. The checks in `lintian_checks' and those
+        # counted by `lintian_pending' (reserved slots and checks that are
+        # being reported) together never exceed `concurrency'.
+        while True:
+            oldest = None
+            with self.lintian_condition:
+                while len(self.lintian_checks) + self.lintian_pending >= self.concurrency:
+                    if self.lintian_checks:
+                        oldest = self.lintian_checks.pop(0)
+                        break
+                    self.lintian_condition.wait()
+                self.lintian_pending += 1
+            if oldest is None:
+                break
+            self.report_lintian_check(*oldest)
+        logger.info("Checking %s for issues using Lintian (in the background) ..", archive)
+        command = ['lintian']
+        if os.getuid() == 0:
+            command.append('--allow-root')
+        command.append(archive)
+        try:
+            command = execute(*command, asynchronous=True, capture=True, merge_streams=True, check=False, logger=logger)
+        except Exception:
+            self.release_lintian_slot()
+            raise
+        with self.lintian_condition:
+            self.lintian_checks.append((archive, command))
+            self.lintian_pending -= 1
+            self.lintian_condition.notify_all()
+
+    def report_lintian_checks(self):
+        """Wait for the Lintian checks started by :func:`check_package()` and report their output."""
+        while True:
+            with self.lintian_condition:
+                if not self.lintian_checks:
+                    break
+                archive, command = self.lintian_checks.pop(0)
+                self.lintian_pending += 1
+            self.report_lintian_check(archive, command)
+
+    def report_lintian_check(self, archive, command):
+        """
+        Wait for a Lintian check and report its output (used by :func:`check_package()`).
+
+        :param archive: The pathname of the checked ``*.deb`` archive (a string).
+        :param command: The :class:`~executor.ExternalCommand` running Lintian.
+        """
+        try:
+            command.wait()
+            output = command.output
+            if output:
+                logger.info("Lintian reported the following about %s:\n%s", archive, output)
+            else:
+                logger.info("Lintian didn't report any issues for %s.", archive)
+        finally:
+            self.release_lintian_slot()
+
+    def release_lintian_slot(self):
+        """Release a slot reserved by :func:`check_package()`."""
+        with self.lintian_condition:
+            self.lintian_pending -= 1
+            self.lintian_condition.notify_all()
+
+    def get_conversion_cache_key(self, pip_install_arguments):
+        """
+        Get the key under which the result of a conversion is stored.
+
+        :param pip_install_arguments: The command line arguments to the ``pip
+                                      install`` command.
+        :returns: A SHA1 hex digest (a string) or :data:`None` when the result
+                  of the conversion shouldn't be cached.
+
+        The key is a fingerprint of the ``pip install`` arguments (including
+        the contents of requirement files and local archives), the options
+        that affect the names and versions of converted packages, the
+        repository directory and the contents of pip-accel's local source
+        index (so that new source distributions in the index are picked up).
+        The result isn't cached when :attr:`conversion_cache_enabled` is
+        :data:`False` or the arguments include an option from
+        :data:`CACHE_UNSAFE_OPTIONS`, a URL or a local directory, because
+        those can change without the fingerprint changing.
+        """
+        if not self.conversion_cache_enabled:
+            return None
+        try:
+            state = hashlib.sha1()
+            for value in (__version__, python_version(), self.repository.directory,
+                          self.install_prefix, self.name_prefix, self.prerelease_workaround,
+                          sorted(self.name_mapping.items()), sorted(self.system_packages.items())):
+                state.update(('%r\0' % (value,)).encode('UTF-8'))
+            source_index = self.pip_accel.config.source_index
+            if os.path.isdir(source_index):
+                for entry in sorted(os.listdir(source_index)):
+                    self.update_fingerprint(state, entry)
+            if self.hash_pip_arguments(state, pip_install_arguments, os.getcwd(), set()):
+                return state.hexdigest()
+        except Exception:
+            logger.warning("Failed to fingerprint pip arguments, not caching conversion.", exc_info=True)
+        return None
+
+    def update_fingerprint(self, state, value):
+        """
+        Update a fingerprint with a string (used by :func:`get_conversion_cache_key()`).
+
+        :param state: A :mod:`hashlib` object.
+        :param value: A string (byte strings are used as is, Unicode strings
+                      are encoded using UTF-8).
+        """
+        if not isinstance(value, bytes):
+            value = value.encode('UTF-8')
+        state.update(value + b'\0')
+
+    def hash_pip_arguments(self, state, arguments, directory, visited):
+        """
+        Update a fingerprint with ``pip install`` arguments (used by :func:`get_conversion_cache_key()`).
+
+        :param state: A :mod:`hashlib` object.
+        :param arguments: The command line arguments to the ``pip install``
+                          command (a list of strings).
+        :param directory: The directory that requirement file references are
+                          relative to (a string).
+        :param visited: A set with the pathnames of the requirement files
+                        that have already been processed.
+        :returns: :data:`True` if the arguments can be cached,
+                  :data:`False` otherwise.
+        """
+        arguments = iter(arguments)
+        for argument in arguments:
+            self.update_fingerprint(state, argument)
+            filename = None
+            if argument in REQUIREMENT_FILE_OPTIONS:
+                filename = next(arguments, '')
+            elif argument.startswith(tuple('%s=' % o for o in REQUIREMENT_FILE_OPTIONS)):
+                filename = argument.partition('=')[2]
+            elif argument.startswith(('-r', '-c')) and not argument.startswith('--'):
+                filename = argument[2:]
+            elif argument.partition('=')[0] in CACHE_UNSAFE_OPTIONS or argument[:2] in CACHE_UNSAFE_OPTIONS:
+                # Also matches the `--editable=.' and `-e.' forms.
+                logger.debug("Not caching conversion because of pip option %r.", argument)
+                return False
+            elif URL_PATTERN.match(argument) or os.path.isdir(argument):
+                logger.debug("Not caching conversion because %r can change.", argument)
+                return False
+            elif os.path.isfile(argument):
+                # Include the contents of local distribution archives.
+                with open(argument, 'rb') as handle:
+                    state.update(handle.read())
+            if filename is not None:
+                filename = os.path.abspath(os.path.join(directory, filename))
+                if not self.hash_requirement_file(state, filename, visited):
+                    return False
+        return True
+
+    def hash_requirement_file(self, state, filename, visited):
+        """
+        Update a fingerprint with a requirement file (used by :func:`hash_pip_arguments()`).
+
+        :param state: A :mod:`hashlib` object.
+        :param filename: The pathname of the requirement file (a string).
+        :param visited: A set with the pathnames of the requirement files
+                        that have already been processed.
+        :returns: :data:`True` if the requirement file can be cached,
+                  :data:`False` otherwise.
+        """
+        if filename in visited:
+            return True
+        visited.add(filename)
+        try:
+            with open(filename, 'rb') as handle:
+                contents = handle.read()
+        except EnvironmentError:
+            # Let pip report the problem.
+            logger.debug("Not caching conversion because %s can't be read.", filename)
+            return False
+        state.update(contents)
+        # Requirement files can reference other requirement files as well as
+        # editable requirements, version control URLs, etc.
+        for line in contents.decode('UTF-8', 'replace').splitlines():
+            line = re.sub(r'(^|\s)#.*$', '', line)
+            if not self.hash_pip_arguments(state, line.split(), os.path.dirname(filename), visited):
+                return False
+        return True
+
+    def recall_conversion(self, cache_key):
+        """
+        Get the result of a previous conversion.
+
+        :param cache_key: The result of :func:`get_conversion_cache_key()`.
+        :returns: The same tuple that :func:`convert()` returns, or :data:`None`
+                  when no (valid) result is available.
+
+        Downloading, unpacking and analyzing the source distributions of a
+        requirement set is the most expensive part of a conversion in which
+        all packages were already converted. When the same requirement set is
+        converted again this method makes it possible to skip all of that. A
+        stored result is only reused when all of its archives still exist
+        and haven't been modified since the result was stored.
+
+        Because pip isn't run, unpinned requirements don't pick up new
+        releases on PyPI until you pass ``--upgrade`` to pip (new source
+        distributions in pip-accel's local source index do invalidate the
+        stored result). This is why :attr:`conversion_cache_enabled` is
+        opt-in.
+        """
+        cache_file = os.path.join(self.conversion_cache_directory, '%s.json' % cache_key)
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file) as handle:
+                entry = json.load(handle)
+            archives = []
+            for filename, last_modified in entry['archives']:
+                if not (os.path.isfile(filename) and os.path.getmtime(filename) == last_modified):
+                    logger.debug("Ignoring previous conversion result (%s changed).", filename)
+                    return None
+                archives.append(filename)
+            relationships = entry['relationships']
+        except Exception:
+            logger.warning("Failed to load previous conversion result from %s!", cache_file, exc_info=True)
+            return None
+        logger.info("Reusing result of previous conversion (%s) ..", cache_file)
+        return archives, relationships
+
+    def persist_conversion(self, cache_key, archives, relationships):
+        """
+        Store the result of a conversion (so that :func:`recall_conversion()` can find it).
+
+        :param cache_key: The result of :func:`get_conversion_cache_key()`.
+        :param archives: The pathnames of the generated archives (a list of
+                         strings and/or :class:`deb_pkg_tools.package.PackageFile` objects).
+        :param relationships: The relationships needed to depend on the
+                              converted package(s) (a list of strings).
+
+        Failing to store the result is logged but otherwise ignored. The
+        result is written to a temporary file that is renamed into place, so
+        concurrent runs never see partially written results.
+        """
+        directory = self.conversion_cache_directory
+        cache_file = os.path.join(directory, '%s.json' % cache_key)
+        try:
+            filenames = [getattr(a, 'filename', a) for a in archives]
+            entry = dict(archives=[(fn, os.path.getmtime(fn)) for fn in filenames],
+                         relationships=relationships)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, temporary_file = tempfile.mkstemp(dir=directory, prefix='.py2deb-', suffix='.json')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(entry, handle)
+            os.rename(temporary_file, cache_file)
+            logger.debug("Stored conversion result in %s.", cache_file)
+        except Exception:
+            logger.warning("Failed to store conversion result in %s!", cache_file, exc_info=True)
+
     def get_source_distributions(self, pip_install_arguments):
         """
         Use :mod:`pip_accel` to download and unpack Python source distributions.
@@ -871,16 +1467,13 @@ class PackageConverter(PropertyManager):
         that would otherwise result in converted packages that cannot be
         installed.
         """
-        matching_packages = [
-            pkg for pkg in self.packages_to_convert
-            if package_names_match(pkg.python_name, python_requirement_name)
-        ]
+        normalized_name = normalize_package_name(python_requirement_name)
+        matching_packages = self.packages_by_name.get(normalized_name, [])
         if len(matching_packages) > 1:
             # My assumption while writing this code is that this should never
             # happen. This check is to make sure that if it does happen it will
             # be noticed because the last thing I want is for this `hack' to
             # result in packages that are silently wrongly converted.
-            normalized_name = normalize_package_name(python_requirement_name)
             num_matches = len(matching_packages)
             raise Exception(compact("""
                 Expected requirement set to contain exactly one Python package
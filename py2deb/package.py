@@ -18,6 +18,7 @@ conversion logic.
 """
 
 # Standard library modules.
+import fnmatch
 import glob
 import logging
 import os
@@ -42,6 +43,7 @@ from py2deb.utils import (
     TemporaryDirectory,
     detect_python_script,
     embed_install_prefix,
+    memoize,
     normalize_package_version,
     package_names_match,
     python_version,
@@ -55,6 +57,15 @@ logger = logging.getLogger(__name__)
 # variable $PATH).
 KNOWN_INSTALL_PREFIXES = ('/usr', '/usr/local')
 
+PYPY_SITE_PACKAGES_PATTERN = re.compile('^(dist|site)-packages/')
+"""Compiled regular expression to match the top level ``site-packages`` directory of PyPy."""
+
+SITE_PACKAGES_PATTERN = re.compile(r'lib/(python|pypy)\d+(\.\d+)*/(dist|site)-packages/')
+"""Compiled regular expression to match ``lib/pythonX.Y/site-packages/`` and similar paths."""
+
+PYPY_VERSION_PATTERN = re.compile(r'/pypy\d(\.\d)?/')
+"""Compiled regular expression to match versioned PyPy directories like ``/pypy2.7/``."""
+
 
 class PackageToConvert(PropertyManager):
 
@@ -237,6 +248,27 @@ class PackageToConvert(PropertyManager):
                 namespaces.add(tuple(dotted_name))
         return sorted(namespaces, key=lambda n: len(n))
 
+    @cached_property
+    def egg_info_directories(self):
+        """
+        The ``*.egg-info`` directories created by pip (a list of strings).
+
+        When pip unpacks a source distribution archive it creates a directory
+        ``pip-egg-info`` which contains the package metadata. This property
+        lists that directory once so that :func:`find_egg_info_file()`
+        doesn't have to search the file system again for every lookup.
+        """
+        directory = os.path.join(self.requirement.source_directory, 'pip-egg-info')
+        if not os.path.isdir(directory):
+            logger.debug("Source distribution doesn't contain %s directory.", directory)
+            return []
+        directories = []
+        for entry in sorted(os.listdir(directory)):
+            pathname = os.path.join(directory, entry)
+            if entry.endswith('.egg-info') and not entry.startswith('.') and os.path.isdir(pathname):
+                directories.append(pathname)
+        return directories
+
     @cached_property
     def has_custom_install_prefix(self):
         """
@@ -297,9 +329,15 @@ class PackageToConvert(PropertyManager):
                 for line in handle:
                     line = line.strip()
                     if line.startswith('['):
+                        if not selected_extras:
+                            # The remaining sections only list the
+                            # requirements of extras (none of which are
+                            # selected) and marker-only sections like
+                            # [:python_version < "3"], which are skipped.
+                            break
                         current_extra = line.strip('[]').lower()
                     elif line and (current_extra is None or current_extra in selected_extras):
-                        requirements.append(Requirement.parse(line))
+                        requirements.append(parse_requirement(line))
         return requirements
 
     @cached_property
@@ -366,12 +404,20 @@ class PackageToConvert(PropertyManager):
             self.debian_name, self.debian_version, self.converter.debian_architecture
         )
 
-    def convert(self):
+    def convert(self, check_package=None):
         """
         Convert current package from Python package to Debian package.
 
+        :param check_package: :data:`True` to check the generated archive
+                              using Lintian, :data:`False` to skip the check
+                              (defaults to :attr:`.PackageConverter.lintian_enabled`).
+                              :func:`.PackageConverter.convert()` skips the
+                              check here because it runs Lintian in the
+                              background instead.
         :returns: The pathname of the generated ``*.deb`` archive.
         """
+        if check_package is None:
+            check_package = self.converter.lintian_enabled
         with TemporaryDirectory(prefix='py2deb-build-') as build_directory:
 
             # Prepare the absolute pathname of the Python interpreter on the
@@ -466,28 +512,23 @@ class PackageToConvert(PropertyManager):
                 overrides_file = os.path.join(overrides_directory, self.debian_name)
                 os.makedirs(overrides_directory)
                 with open(overrides_file, 'w') as handle:
-                    for tag in self.converter.lintian_ignore:
-                        handle.write('%s: %s\n' % (self.debian_name, tag))
+                    handle.write(''.join('%s: %s\n' % (self.debian_name, tag)
+                                         for tag in self.converter.lintian_ignore))
 
             # Find the alternatives relevant to the package we're building.
             alternatives = set((link, path) for link, path in self.converter.alternatives
                                if os.path.isfile(os.path.join(build_directory, path.lstrip('/'))))
 
             # Generate post-installation and pre-removal maintainer scripts.
-            self.generate_maintainer_script(filename=os.path.join(debian_directory, 'postinst'),
-                                            python_executable=python_executable,
-                                            function='post_installation_hook',
-                                            package_name=self.debian_name,
-                                            alternatives=alternatives,
-                                            modules_directory=install_modules_directory,
-                                            namespaces=self.namespaces)
-            self.generate_maintainer_script(filename=os.path.join(debian_directory, 'prerm'),
-                                            python_executable=python_executable,
-                                            function='pre_removal_hook',
-                                            package_name=self.debian_name,
-                                            alternatives=alternatives,
-                                            modules_directory=install_modules_directory,
-                                            namespaces=self.namespaces)
+            for script_name, function in (('postinst', 'post_installation_hook'),
+                                          ('prerm', 'pre_removal_hook')):
+                self.generate_maintainer_script(filename=os.path.join(debian_directory, script_name),
+                                                python_executable=python_executable,
+                                                function=function,
+                                                package_name=self.debian_name,
+                                                alternatives=alternatives,
+                                                modules_directory=install_modules_directory,
+                                                namespaces=self.namespaces)
 
             # Enable a user defined Python callback to manipulate the resulting
             # binary package before it's turned into a *.deb archive (e.g.
@@ -498,7 +539,7 @@ class PackageToConvert(PropertyManager):
                 logger.debug("User defined Python callback finished!")
 
             return build_package(directory=build_directory,
-                                 check_package=self.converter.lintian_enabled,
+                                 check_package=check_package,
                                  copy_files=False)
 
     def transform_binary_dist(self, interpreter):
@@ -536,11 +577,11 @@ class PackageToConvert(PropertyManager):
                 # In this if branch we change 2 to look like 1 so that the
                 # following if/else branches don't need to care about the
                 # difference.
-                member.name = re.sub('^(dist|site)-packages/', regular_pypy_path, member.name)
+                member.name = PYPY_SITE_PACKAGES_PATTERN.sub(regular_pypy_path, member.name)
             if self.has_custom_install_prefix:
                 # Strip the complete /usr/lib/pythonX.Y/site-packages/ prefix
                 # so we can replace it with the custom installation prefix.
-                member.name = re.sub(r'lib/(python|pypy)\d+(\.\d+)*/(dist|site)-packages/', 'lib/', member.name)
+                member.name = SITE_PACKAGES_PATTERN.sub('lib/', member.name)
                 # Rewrite executable Python scripts so they know about the
                 # custom installation prefix.
                 if is_executable:
@@ -557,7 +598,7 @@ class PackageToConvert(PropertyManager):
                     # See also the build https://travis-ci.org/paylogic/py2deb/builds/456594190
                     # which clearly shows that /usr/lib/pypy2.7/dist-packages doesn't work
                     # (which I've since confirmed in local testing).
-                    member.name = re.sub(r'/pypy\d(\.\d)?/', '/pypy/', member.name)
+                    member.name = PYPY_VERSION_PATTERN.sub('/pypy/', member.name)
                 # Rewrite /site-packages/ to /dist-packages/. For details see
                 # https://wiki.debian.org/Python#Deviations_from_upstream.
                 member.name = member.name.replace('/site-packages/', '/dist-packages/')
@@ -588,10 +629,13 @@ class PackageToConvert(PropertyManager):
         .. _shebang: https://en.wikipedia.org/wiki/Shebang_(Unix)
         """
         if detect_python_script(handle):
-            lines = handle.readlines()
-            lines[0] = b'#!' + interpreter.encode('ascii') + b'\n'
-            handle = BytesIO(b''.join(lines))
-            handle.seek(0)
+            shebang = b'#!' + interpreter.encode('ascii') + b'\n'
+            if handle.readline() == shebang:
+                # Avoid copying scripts that already reference the interpreter.
+                handle.seek(0)
+            else:
+                # Replace the first line without splitting the rest into lines.
+                handle = BytesIO(shebang + handle.read())
         return handle
 
     def determine_package_architecture(self, has_shared_object_files):
@@ -642,23 +686,24 @@ class PackageToConvert(PropertyManager):
             logger.debug("Loading control field overrides from %s ..", py2deb_cfg)
             parser = configparser.RawConfigParser()
             parser.read(py2deb_cfg)
-            # Prepare to load the overrides from the DEFAULT section and
-            # the section whose name matches that of the Python package.
-            # DEFAULT is processed first on purpose.
-            section_names = ['DEFAULT']
+            # Prepare to load the overrides from the section(s) whose name
+            # matches that of the Python package. The values in the DEFAULT
+            # section are included by parser.items() so they only apply
+            # when such a section exists.
+            #
             # Match the normalized package name instead of the raw package
             # name because `python setup.py egg_info' normalizes
             # underscores in package names to dashes which can bite
             # unsuspecting users. For what it's worth, PEP-8 discourages
             # underscores in package names but doesn't forbid them:
             # https://www.python.org/dev/peps/pep-0008/#package-and-module-names
-            section_names.extend(section_name for section_name in parser.sections()
-                                 if package_names_match(section_name, self.python_name))
-            for section_name in section_names:
-                if parser.has_section(section_name):
+            for section_name in parser.sections():
+                if package_names_match(section_name, self.python_name):
                     overrides = dict(parser.items(section_name))
                     logger.debug("Found %i control file field override(s) in section %s of %s: %r",
                                  len(overrides), section_name, py2deb_cfg, overrides)
+                    # Merging each section separately combines relationship
+                    # fields like Depends defined in several sections.
                     control_fields = merge_control_fields(control_fields, overrides)
         return control_fields
 
@@ -676,21 +721,14 @@ class PackageToConvert(PropertyManager):
                           :mod:`py2deb.hooks` are serialized and embedded
                           inside the generated maintainer script.
         """
-        # Read the py2deb/hooks.py script.
-        py2deb_directory = os.path.dirname(os.path.abspath(__file__))
-        hooks_script = os.path.join(py2deb_directory, 'hooks.py')
-        with open(hooks_script) as handle:
-            contents = handle.read()
-        blocks = contents.split('\n\n')
-        # Generate the shebang / hashbang line.
-        blocks.insert(0, '#!%s' % python_executable)
         # Generate the call to the top level function.
         encoded_arguments = ', '.join('%s=%r' % (k, v) for k, v in arguments.items())
-        blocks.append('%s(%s)' % (function, encoded_arguments))
-        # Write the maintainer script.
+        # Write the maintainer script: The shebang / hashbang line, the
+        # contents of the py2deb/hooks.py script and the function call.
         with open(filename, 'w') as handle:
-            handle.write('\n\n'.join(blocks))
-            handle.write('\n')
+            handle.write('#!%s\n\n%s\n\n%s(%s)\n' % (
+                python_executable, load_hooks_script(), function, encoded_arguments,
+            ))
         # Make sure the maintainer script is executable.
         os.chmod(filename, 0o755)
 
@@ -702,12 +740,19 @@ class PackageToConvert(PropertyManager):
         ``pip-egg-info`` which contains the package metadata in a declarative
         and easy to parse format. This method finds such metadata files.
 
-        :param pattern: The :mod:`glob` pattern to search for (a string).
+        :param pattern: The :mod:`fnmatch` pattern to search for (a string).
+                        When this is empty the ``*.egg-info`` directory
+                        itself is matched.
         :returns: A list of matched filenames (strings).
         """
-        full_pattern = os.path.join(self.requirement.source_directory, 'pip-egg-info', '*.egg-info', pattern)
-        logger.debug("Looking for %r file(s) using pattern %r ..", pattern, full_pattern)
-        matches = glob.glob(full_pattern)
+        logger.debug("Looking for %r file(s) in %s ..", pattern, concatenate(self.egg_info_directories))
+        matches = []
+        for directory in self.egg_info_directories:
+            if pattern:
+                matches.extend(os.path.join(directory, entry) for entry in
+                               sorted(fnmatch.filter(os.listdir(directory), pattern)))
+            else:
+                matches.append(os.path.join(directory, ''))
         if len(matches) > 1:
             msg = "Source distribution directory of %s (%s) contains multiple *.egg-info directories: %s"
             raise Exception(msg % (self.requirement.project_name, self.requirement.version, concatenate(matches)))
@@ -716,3 +761,35 @@ class PackageToConvert(PropertyManager):
             return matches[0]
         else:
             logger.debug("No matching %r files found.", pattern)
+
+
+@memoize
+def load_hooks_script():
+    """
+    Get the contents of the :mod:`py2deb.hooks` module.
+
+    :returns: The contents of the ``py2deb/hooks.py`` script (a string).
+
+    The script is embedded in every generated maintainer script but it
+    doesn't change while py2deb is running, so it's only read once.
+    """
+    py2deb_directory = os.path.dirname(os.path.abspath(__file__))
+    hooks_script = os.path.join(py2deb_directory, 'hooks.py')
+    logger.debug("Reading maintainer script template: %s", hooks_script)
+    with open(hooks_script) as handle:
+        return handle.read()
+
+
+@memoize
+def parse_requirement(line):
+    """
+    Parse a requirement from a ``requires.txt`` file.
+
+    :param line: The requirement line (a string).
+    :returns: A :class:`pkg_resources.Requirement` object.
+
+    Packages in the same dependency closure tend to share requirements and
+    :func:`pkg_resources.Requirement.parse()` is relatively expensive, so
+    each distinct line is only parsed once.
+    """
+    return Requirement.parse(line)
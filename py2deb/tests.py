@@ -17,31 +17,39 @@ dependencies.
 """
 
 # Standard library modules.
+import collections
 import fnmatch
 import functools
 import glob
 import logging
+import multiprocessing
 import os
 import shutil
 import sys
 import tempfile
+import threading
 
 # External dependencies.
 import coloredlogs
 from deb_pkg_tools.checks import DuplicateFilesFound
-from deb_pkg_tools.control import load_control_file, patch_control_file
+from deb_pkg_tools.control import load_control_file, patch_control_file, unparse_control_fields
 from deb_pkg_tools.package import inspect_package, parse_filename
 from executor import execute
 from humanfriendly.text import dedent
 from humanfriendly.testing import TestCase, run_cli
+from six import BytesIO
 
 # Modules included in our package.
 from py2deb.cli import main
 from py2deb.converter import PackageConverter
+from py2deb.package import PackageToConvert
 from py2deb.utils import (
+    PackageRepository,
     TemporaryDirectory,
     convert_package_name,
     default_name_prefix,
+    environment_defaults,
+    memoize,
     normalize_package_version,
     python_version,
 )
@@ -141,6 +149,8 @@ class PackageConverterTestCase(TestCase):
         self.assertRaises(ValueError, converter.install_alternative, '', 'path')
         self.assertRaises(ValueError, converter.set_conversion_command, 'package-name', '')
         self.assertRaises(ValueError, converter.set_conversion_command, '', 'command')
+        self.assertRaises(ValueError, converter.set_concurrency, 0)
+        self.assertRaises(ValueError, converter.set_concurrency, 'many')
         exit_code, output = run_cli(main, '--unsupported-option')
         assert exit_code != 0
         exit_code, output = run_cli(main, '--report-dependencies', '/tmp/definitely-not-an-existing-control-file')
@@ -165,6 +175,126 @@ class PackageConverterTestCase(TestCase):
         assert normalize_package_version('1.0a2', prerelease_workaround=True) == '1.0~a2'
         assert normalize_package_version('1.0a2', prerelease_workaround=False) == '1.0a2'
 
+    def test_environment_defaults(self):
+        """Test the :func:`py2deb.utils.environment_defaults()` context manager."""
+        os.environ['PY2DEB_TEST_EXISTING'] = 'original'
+        try:
+            with environment_defaults(dict(PY2DEB_TEST_EXISTING='changed', PY2DEB_TEST_NEW='added')):
+                # Existing variables are left alone, new variables are added.
+                assert os.environ['PY2DEB_TEST_EXISTING'] == 'original'
+                assert os.environ['PY2DEB_TEST_NEW'] == 'added'
+            # Added variables are removed afterwards.
+            assert os.environ['PY2DEB_TEST_EXISTING'] == 'original'
+            assert 'PY2DEB_TEST_NEW' not in os.environ
+        finally:
+            del os.environ['PY2DEB_TEST_EXISTING']
+
+    def test_build_jobs(self):
+        """Test that :func:`.PackageConverter.get_build_jobs()` divides the CPU cores between workers."""
+        converter = self.create_isolated_converter()
+        num_cores = multiprocessing.cpu_count()
+        num_jobs = [converter.get_build_jobs(n) for n in range(1, num_cores * 2 + 1)]
+        # A single worker gets all of the cores.
+        assert num_jobs[0] == num_cores
+        assert converter.get_build_environment(1)['MAKEFLAGS'] == '-j%i' % num_cores
+        # The number of jobs drops as the number of workers rises.
+        assert num_jobs == sorted(num_jobs, reverse=True)
+        # But it never drops below one.
+        assert min(num_jobs) == 1
+        assert converter.get_build_jobs(num_cores * 2) == 1
+
+    def test_report_lintian_checks(self):
+        """Test that :func:`.PackageConverter.report_lintian_checks()` waits for all checks."""
+        converter = self.create_isolated_converter()
+        commands = [execute('echo', str(i), asynchronous=True, capture=True) for i in range(3)]
+        converter.lintian_checks.extend(('%i.deb' % i, c) for i, c in enumerate(commands))
+        converter.report_lintian_checks()
+        assert not converter.lintian_checks
+        assert converter.lintian_pending == 0
+        assert all(c.is_finished for c in commands)
+
+    def test_find_missing_system_packages(self):
+        """Test :func:`.PackageConverter.find_missing_system_packages()`."""
+        converter = self.create_isolated_converter()
+        missing = converter.find_missing_system_packages(['dpkg', 'py2deb-nonexistent-package'])
+        assert missing == ['py2deb-nonexistent-package']
+        assert 'dpkg' in converter.installed_system_packages
+
+    def test_convert_package_name(self):
+        """Test the :func:`py2deb.utils.convert_package_name()` function."""
+        assert convert_package_name('python-debian', name_prefix='python') == 'python-debian'
+        assert convert_package_name('raven', name_prefix='python', extras=('Flask',)) == 'python-raven-flask'
+        # Extras can be given as a list (in any order).
+        for extras in (['flask', 'celery'], ('celery', 'flask')):
+            assert convert_package_name('raven', name_prefix='python', extras=extras) == 'python-raven-celery-flask'
+
+    def test_memoize(self):
+        """Test the :func:`py2deb.utils.memoize()` decorator."""
+        calls = []
+
+        @memoize
+        def power(number, exponent=2):
+            calls.append((number, exponent))
+            return number ** exponent
+
+        assert power(3) == 9
+        assert power(3) == 9
+        assert power(4) == 16
+        assert power(2, exponent=3) == 8
+        assert power(2, exponent=3) == 8
+        assert calls == [(3, 2), (4, 2), (2, 3)]
+
+    def test_package_repository(self):
+        """Test package lookups in :class:`py2deb.utils.PackageRepository` objects."""
+        with TemporaryDirectory() as directory:
+            for filename in ('foo_1.0_all.deb', 'foo_1.1_all.deb', 'bar_1.0_amd64.deb'):
+                touch(os.path.join(directory, filename))
+            repository = PackageRepository(directory)
+            foo = repository.get_package('foo', '1.1', 'all')
+            assert foo.filename == os.path.join(directory, 'foo_1.1_all.deb')
+            bar = repository.get_package('bar', '1.0', 'amd64')
+            assert bar.filename == os.path.join(directory, 'bar_1.0_amd64.deb')
+            assert repository.get_package('bar', '1.0', 'all') is None
+            assert repository.get_package('baz', '1.0', 'all') is None
+            # Archives added after the directory was scanned can be registered.
+            touch(os.path.join(directory, 'baz_1.0_all.deb'))
+            repository.add_archive(os.path.join(directory, 'baz_1.0_all.deb'))
+            repository.add_archive(os.path.join(directory, 'baz_1.0_all.deb'))
+            assert repository.get_package('baz', '1.0', 'all').filename == os.path.join(directory, 'baz_1.0_all.deb')
+            assert len(repository.archives) == 4
+            assert repository.archives == sorted(repository.archives)
+            assert [a.name for a in repository.archives] == ['bar', 'baz', 'foo', 'foo']
+
+    def test_control_field_overrides(self):
+        """Test :func:`py2deb.package.PackageToConvert.load_control_field_overrides()`."""
+        with TemporaryDirectory() as directory:
+            requirement = collections.namedtuple('Requirement', 'name source_directory')('foo_bar', directory)
+            package = PackageToConvert(converter=None, requirement=requirement)
+            defaults = unparse_control_fields(dict(package='python-foo-bar', depends=['python']))
+            # A stdeb.cfg file that only has a DEFAULT section is ignored.
+            with open(os.path.join(directory, 'stdeb.cfg'), 'w') as handle:
+                handle.write('[DEFAULT]\nSuite: unstable\nDepends: python-foo\n')
+            assert package.load_control_field_overrides(defaults) == defaults
+            # Relationship fields of all matching sections are combined.
+            with open(os.path.join(directory, 'stdeb.cfg'), 'w') as handle:
+                handle.write('[foo_bar]\nDepends: libfoo\n[foo-bar]\nDepends: libbar\n[baz]\nDepends: libbaz\n')
+            control_fields = package.load_control_field_overrides(defaults)
+            assert control_fields['Depends'] == 'libbar, libfoo, python'
+
+    def test_update_shebang(self):
+        """Test the :func:`py2deb.package.PackageToConvert.update_shebang()` method."""
+        package = PackageToConvert(converter=None, requirement=None)
+        # Python scripts get the new interpreter.
+        handle = package.update_shebang(BytesIO(b'#!/usr/bin/env python\nprint(42)\n'), '/usr/bin/python3.7')
+        assert handle.read() == b'#!/usr/bin/python3.7\nprint(42)\n'
+        # Scripts that already reference the interpreter are left alone.
+        original = BytesIO(b'#!/usr/bin/python3.7\nprint(42)\n')
+        handle = package.update_shebang(original, '/usr/bin/python3.7')
+        assert handle is original and handle.read() == b'#!/usr/bin/python3.7\nprint(42)\n'
+        # Other executables are left alone.
+        original = BytesIO(b'#!/bin/sh\necho 42\n')
+        assert package.update_shebang(original, '/usr/bin/python3.7').read() == b'#!/bin/sh\necho 42\n'
+
     def test_conversion_of_simple_package(self):
         """
         Convert a simple Python package without any dependencies.
@@ -327,6 +457,66 @@ class PackageConverterTestCase(TestCase):
                 logger.debug("Checking Python dependency %s ..", python_dependency)
                 assert metadata['Depends'].matches(python_dependency) is not None
 
+    def test_concurrent_conversion(self):
+        """
+        Convert a group of packages concurrently.
+
+        Converts coloredlogs_ and its dependency humanfriendly_ using two
+        concurrent workers and sanity checks the result.
+
+        .. _humanfriendly: https://pypi.org/project/humanfriendly
+        """
+        with TemporaryDirectory() as directory:
+            # Run the conversion command.
+            converter = self.create_isolated_converter()
+            converter.set_repository(directory)
+            converter.set_concurrency(2)
+            # Record the threads that convert packages.
+            threads = set()
+            convert_package = converter.convert_package
+
+            def record_thread(package):
+                threads.add(threading.current_thread().name)
+                return convert_package(package)
+
+            converter.convert_package = record_thread
+            archives, relationships = converter.convert(['coloredlogs==6.0'])
+            # Make sure the packages were converted by the thread pool.
+            assert threads and threading.current_thread().name not in threads
+            # Make sure pip-accel's system package manager was restored.
+            assert 'install_dependencies' not in vars(converter.pip_accel.bdists.system_package_manager)
+            # Make sure both packages were converted into the repository.
+            assert len(archives) == 2
+            assert all(os.path.dirname(a) == directory for a in archives)
+            assert find_package_archive(archives, fix_name_prefix('python-coloredlogs'))
+            assert find_package_archive(archives, fix_name_prefix('python-humanfriendly'))
+
+    def test_conversion_cache(self):
+        """Test that the result of a conversion is reused when nothing changed."""
+        with TemporaryDirectory() as directory:
+            converter = self.create_isolated_converter()
+            converter.set_repository(directory)
+            # The conversion cache is opt-in.
+            assert converter.get_conversion_cache_key(['coloredlogs==0.5']) is None
+            converter.set_conversion_cache_enabled(True)
+            archives, relationships = converter.convert(['coloredlogs==0.5'])
+            # Make sure the second conversion doesn't even invoke pip.
+            get_source_distributions = converter.get_source_distributions
+            converter.get_source_distributions = None
+            assert converter.convert(['coloredlogs==0.5']) == (archives, relationships)
+            # Make sure the cache is invalidated when an archive changes.
+            os.utime(archives[0], (0, 0))
+            converter.get_source_distributions = get_source_distributions
+            assert converter.convert(['coloredlogs==0.5'])[1] == relationships
+            # Make sure arguments that can change without the fingerprint
+            # changing (pip's --upgrade option, editable requirements, find
+            # links and URLs) bypass the cache.
+            for arguments in (['--upgrade', 'coloredlogs'], ['-e.'], ['--editable=.'],
+                              ['-egit+https://github.com/xolox/python-coloredlogs.git'],
+                              ['--find-links=%s' % directory, 'coloredlogs'], ['-f', directory, 'coloredlogs'],
+                              ['https://github.com/xolox/python-coloredlogs/archive/0.5.tar.gz']):
+                assert converter.get_conversion_cache_key(arguments) is None
+
     def test_conversion_of_extras(self):
         """
         Convert a package with extras.
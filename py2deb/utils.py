@@ -9,6 +9,9 @@
 """The :mod:`py2deb.utils` module contains miscellaneous code."""
 
 # Standard library modules.
+import bisect
+import contextlib
+import functools
 import logging
 import os
 import platform
@@ -20,7 +23,7 @@ import tempfile
 
 # External dependencies.
 from property_manager import PropertyManager, cached_property, required_property
-from deb_pkg_tools.package import find_package_archives
+from deb_pkg_tools.package import find_package_archives, parse_filename
 from six import BytesIO
 
 # Initialize a logger.
@@ -29,6 +32,9 @@ logger = logging.getLogger(__name__)
 integer_pattern = re.compile('([0-9]+)')
 """Compiled regular expression to match a consecutive run of digits."""
 
+FUTURE_IMPORT_PATTERN = re.compile(b'^\\s*from\\s+__future__\\s+import\\s+')
+"""Compiled regular expression to match ``from __future__ import ...`` statements (in byte strings)."""
+
 PYTHON_EXECUTABLE_PATTERN = re.compile(r'^(pypy(\d\.\d)?|python(\d(\.\d)?)?m?)$')
 """
 A compiled regular expression to match Python interpreter executable names.
@@ -100,12 +106,48 @@ class PackageRepository(PropertyManager):
                      filename='/tmp/py2deb-six_1.6.1_all.deb')]
 
         """
-        return find_package_archives(self.directory)
+        return sorted(find_package_archives(self.directory))
+
+    @cached_property
+    def archives_index(self):
+        """
+        The archives in :attr:`archives` indexed by package identity (a dictionary).
+
+        The keys of this dictionary are tuples with the name and architecture
+        of a package and the values are lists of the corresponding
+        :class:`deb_pkg_tools.package.PackageFile` objects (one for each
+        available version). This enables :func:`get_package()` to find
+        packages without scanning the complete list of archives for every
+        lookup.
+        """
+        index = {}
+        for archive in self.archives:
+            index.setdefault((archive.name, archive.architecture), []).append(archive)
+        return index
 
     @required_property
     def directory(self):
         """The pathname of a directory containing ``*.deb`` archives (a string)."""
 
+    def add_archive(self, filename):
+        """
+        Register a package archive that was added to the repository.
+
+        :param filename: The pathname of a ``*.deb`` archive inside
+                         :attr:`directory` (a string).
+        :returns: A :class:`deb_pkg_tools.package.PackageFile` object.
+
+        This updates :attr:`archives` and :attr:`archives_index` so that
+        :func:`get_package()` can find the new archive without scanning
+        the directory again.
+        """
+        archive = parse_filename(filename)
+        versions = self.archives_index.setdefault((archive.name, archive.architecture), [])
+        if not any(other.filename == archive.filename for other in versions):
+            bisect.insort(self.archives, archive)
+            versions.append(archive)
+        return archive
+
     def get_package(self, package, version, architecture):
         """
         Find a package in the repository.
@@ -123,8 +165,8 @@ class PackageRepository(PropertyManager):
         :returns: A :class:`deb_pkg_tools.package.PackageFile` object
                   or ``None``.
         """
-        for archive in self.archives:
-            if archive.name == package and archive.version == version and archive.architecture == architecture:
+        for archive in self.archives_index.get((package, architecture), []):
+            if archive.version == version:
                 return archive
 
 
@@ -164,6 +206,33 @@ class TemporaryDirectory(object):
         del self.temporary_directory
 
 
+def memoize(function):
+    """
+    Cache the results of a function.
+
+    :param function: The function whose results should be cached. The
+                     positional and keyword arguments of the function are
+                     used as the cache key, so they have to be hashable.
+    :returns: A wrapper for the function that computes each result only once.
+
+    This is a simple alternative to :func:`functools.lru_cache()` (which isn't
+    available on Python 2) intended for functions whose results don't change
+    during the lifetime of the process.
+    """
+    cache = {}
+
+    @functools.wraps(function)
+    def wrapper(*args, **kw):
+        key = (args, tuple(sorted(kw.items()))) if kw else args
+        try:
+            return cache[key]
+        except KeyError:
+            value = function(*args, **kw)
+            cache[key] = value
+            return value
+    return wrapper
+
+
 def compact_repeating_words(words):
     """
     Remove adjacent repeating words.
@@ -201,11 +270,21 @@ def convert_package_name(python_package_name, name_prefix=None, extras=()):
     :param name_prefix: The name prefix to apply (a string or :data:`None`, in
                         which case the result of :func:`default_name_prefix()`
                         is used instead).
+    :param extras: An iterable of strings with the names of the extras
+                   requested for the package (defaults to no extras).
     :returns: A Debian package name (a string).
     """
-    # Apply the name prefix.
-    if not name_prefix:
-        name_prefix = default_name_prefix()
+    # Normalize the extras so that the (memoized) conversion below can use
+    # them as a cache key (callers are allowed to pass a list).
+    return cached_package_name_conversion(
+        python_package_name, name_prefix or default_name_prefix(),
+        tuple(sorted(extra.lower() for extra in extras)),
+    )
+
+
+@memoize
+def cached_package_name_conversion(python_package_name, name_prefix, extras):
+    """Implementation of :func:`convert_package_name()` (memoized)."""
     debian_package_name = '%s-%s' % (name_prefix, python_package_name)
     # Normalize casing and special characters.
     debian_package_name = normalize_package_name(debian_package_name)
@@ -215,9 +294,7 @@ def convert_package_name(python_package_name, name_prefix=None, extras=()):
     # package. Because Debian doesn't have this concept we encode the names of
     # the extras in the name of the package.
     if extras:
-        words = [debian_package_name]
-        words.extend(sorted(extra.lower() for extra in extras))
-        debian_package_name = '-'.join(words)
+        debian_package_name = '-'.join((debian_package_name,) + extras)
     return debian_package_name
 
 
@@ -281,7 +358,7 @@ def embed_install_prefix(handle, install_prefix):
         # The next step is to bump the insertion point if we find any `from
         # __future__ import ...' statements.
         for i, line in enumerate(lines):
-            if re.match(b'^\\s*from\\s+__future__\\s+import\\s+', line):
+            if FUTURE_IMPORT_PATTERN.match(line):
                 insertion_point = i + 1
         lines.insert(insertion_point, ('import sys; sys.path.insert(0, %r)\n' % install_prefix).encode('UTF-8'))
         # Turn the modified contents back into a file-like object.
@@ -292,6 +369,30 @@ def embed_install_prefix(handle, install_prefix):
     return handle
 
 
+@contextlib.contextmanager
+def environment_defaults(variables):
+    """
+    Temporarily provide defaults for environment variables.
+
+    :param variables: A dictionary with the names (strings) and values
+                      (strings) of environment variables.
+
+    This context manager sets the given environment variables for the duration
+    of the :keyword:`with` block, but only those that aren't already defined
+    (so the operator's preferences win). Afterwards the variables that were
+    added are removed again.
+    """
+    added = [name for name in sorted(variables) if name not in os.environ]
+    for name in added:
+        logger.debug("Setting environment variable $%s to %r ..", name, variables[name])
+        os.environ[name] = variables[name]
+    try:
+        yield
+    finally:
+        for name in added:
+            os.environ.pop(name, None)
+
+
 def extract_shebang_command(handle):
     """
     Extract the shebang_ command line from an executable script.
@@ -329,6 +430,7 @@ def extract_shebang_program(command):
     return os.path.basename(tokens[0]) if tokens else ''
 
 
+@memoize
 def normalize_package_name(python_package_name):
     """
     Normalize Python package name to be used as Debian package name.